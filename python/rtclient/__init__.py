@@ -4,7 +4,7 @@
 import asyncio
 import base64
 import uuid
-from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable, Set
 from typing import Literal, Optional, TypeGuard, Union
 
 from azure.core.credentials import AzureKeyCredential
@@ -20,6 +20,7 @@ from rtclient.models import (
     UnknownMessage,
     FunctionCallItem,
     FunctionCallOutputItem,
+    FunctionTool,
     FunctionToolChoice,
     InputAudioBufferAppendMessage,
     InputAudioBufferClearedMessage,
@@ -45,6 +46,7 @@ from rtclient.models import (
     MessageItem,
     MessageItemType,
     MessageRole,
+    Modalities,
     Modality,
     NoTurnDetection,
     OutputTextContentPart,
@@ -105,10 +107,23 @@ from rtclient.models import (
     UserMessageType,
     Voice,
     create_message_from_dict,
+    create_message_from_json,
+    dump_user_message,
 )
 from rtclient.util.id_generator import generate_id
 from rtclient.util.message_queue import MessageQueueWithError
 
+_AUDIO_CHUNK_MESSAGE_TYPES = frozenset({"response.audio.delta", "response.audio.done"})
+_AUDIO_TRANSCRIPT_CHUNK_MESSAGE_TYPES = frozenset({"response.audio_transcript.delta", "response.audio_transcript.done"})
+_AUDIO_CONTENT_MESSAGE_TYPES = (
+    _AUDIO_CHUNK_MESSAGE_TYPES | _AUDIO_TRANSCRIPT_CHUNK_MESSAGE_TYPES | {"response.content_part.done"}
+)
+_TEXT_CHUNK_MESSAGE_TYPES = frozenset({"response.text.delta", "response.text.done"})
+_TEXT_CONTENT_MESSAGE_TYPES = _TEXT_CHUNK_MESSAGE_TYPES | {"response.content_part.done"}
+_FUNCTION_CALL_ARGUMENTS_MESSAGE_TYPES = frozenset(
+    {"response.function_call_arguments.delta", "response.function_call_arguments.done"}
+)
+
 
 class RealtimeException(Exception):
     def __init__(self, error: RealtimeError):
@@ -243,13 +258,7 @@ class RTAudioContent:
                 ResponseContentPartDoneMessage,
             ]
         ]:
-            return m.type in [
-                "response.audio.delta",
-                "response.audio.done",
-                "response.audio_transcript.delta",
-                "response.audio_transcript.done",
-                "response.content_part.done",
-            ]
+            return m.type in _AUDIO_CONTENT_MESSAGE_TYPES
 
         return await self.__queue.receive(
             lambda m: is_valid_message(m) and m.item_id == self.item_id and m.content_index == self.content_index
@@ -269,9 +278,7 @@ class RTAudioContent:
 
     async def audio_chunks(self) -> AsyncGenerator[bytes]:
         while True:
-            message = await self.__content_queue.receive(
-                lambda m: m.type in ["response.audio.delta", "response.audio.done"]
-            )
+            message = await self.__content_queue.receive(lambda m: m.type in _AUDIO_CHUNK_MESSAGE_TYPES)
             if message is None:
                 break
             if message.type == "response.content_part.done":
@@ -288,9 +295,7 @@ class RTAudioContent:
 
     async def transcript_chunks(self) -> AsyncGenerator[str]:
         while True:
-            message = await self.__content_queue.receive(
-                lambda m: m.type in ["response.audio_transcript.delta", "response.audio_transcript.done"]
-            )
+            message = await self.__content_queue.receive(lambda m: m.type in _AUDIO_TRANSCRIPT_CHUNK_MESSAGE_TYPES)
             if message is None:
                 break
             if message.type == "response.content_part.done":
@@ -328,11 +333,7 @@ class RTTextContent:
                 ResponseContentPartDoneMessage,
             ]
         ]:
-            return m.type in [
-                "response.text.delta",
-                "response.text.done",
-                "response.content_part.done",
-            ]
+            return m.type in _TEXT_CONTENT_MESSAGE_TYPES
 
         return await self.__queue.receive(
             lambda m: is_valid_message(m) and m.item_id == self.item_id and m.content_index == self.content_index
@@ -352,9 +353,7 @@ class RTTextContent:
 
     async def text_chunks(self) -> AsyncGenerator[str]:
         while True:
-            message = await self.__content_queue.receive(
-                lambda m: m.type in ["response.text.delta", "response.text.done"]
-            )
+            message = await self.__content_queue.receive(lambda m: m.type in _TEXT_CHUNK_MESSAGE_TYPES)
             if message is None:
                 break
             if message.type == "response.content_part.done":
@@ -455,10 +454,7 @@ class RTFunctionCallItem:
     async def __inner_iter(self):
         while True:
             message = await self.__queue.receive(
-                lambda m: (
-                    m.type in ["response.function_call_arguments.delta", "response.function_call_arguments.done"]
-                    and m.item_id == self.id
-                )
+                lambda m: (m.type in _FUNCTION_CALL_ARGUMENTS_MESSAGE_TYPES and m.item_id == self.id)
                 or (m.type == "response.output_item.done" and m.item.id == self.id)
             )
             if message is None:
@@ -602,7 +598,7 @@ class RTClient:
     async def configure(
         self,
         model: Optional[str] = None,
-        modalities: Optional[set[Modality]] = None,
+        modalities: Optional[Set[Modality]] = None,
         voice: Optional[Voice] = None,
         instructions: Optional[str] = None,
         input_audio_format: Optional[AudioFormat] = None,
@@ -648,9 +644,8 @@ class RTClient:
         self.session = message.session
         return message.session
 
-    async def send_audio(self, audio: bytes) -> None:
-        base64_encoded = base64.b64encode(audio).decode("utf-8")
-        await self._client.send(InputAudioBufferAppendMessage(audio=base64_encoded))
+    async def send_audio(self, audio: bytes | bytearray | memoryview) -> None:
+        await self._client.send(InputAudioBufferAppendMessage(audio=audio))
 
     async def commit_audio(self) -> RTInputAudioItem:
         await self._client.send(InputAudioBufferCommitMessage())
@@ -674,7 +669,8 @@ class RTClient:
 
     # TODO: Consider splitting this into one method per type of item.
     async def send_item(self, item: Item, previous_item_id: Optional[str] = None) -> ResponseItem:
-        item.id = item.id or generate_id("item")
+        if item.id is None:
+            item = item.model_copy(update={"id": generate_id("item")})
         await self._client.send(ItemCreateMessage(previous_item_id=previous_item_id, item=item))
         message = await self._message_queue.receive(
             lambda m: m.type == "conversation.item.created" and m.item.id == item.id
@@ -748,9 +744,11 @@ __all__ = [
     "Voice",
     "AudioFormat",
     "Modality",
+    "Modalities",
     "NoTurnDetection",
     "ServerVAD",
     "TurnDetection",
+    "FunctionTool",
     "FunctionToolChoice",
     "ToolChoice",
     "MessageRole",
@@ -838,4 +836,6 @@ __all__ = [
     "UserMessageType",
     "ServerMessageType",
     "create_message_from_dict",
+    "create_message_from_json",
+    "dump_user_message",
 ]
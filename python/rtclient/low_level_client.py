@@ -1,7 +1,6 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
-import json
 import os
 import uuid
 from collections.abc import AsyncIterator
@@ -11,7 +10,7 @@ from aiohttp import ClientSession, WSMsgType, WSServerHandshakeError
 from azure.core.credentials import AzureKeyCredential
 from azure.core.credentials_async import AsyncTokenCredential
 
-from rtclient.models import ServerMessageType, UserMessageType, create_message_from_dict
+from rtclient.models import ServerMessageType, UserMessageType, create_message_from_json, dump_user_message
 from rtclient.util.user_agent import get_user_agent
 
 
@@ -101,17 +100,21 @@ class RTLowLevelClient:
 
     async def send(self, message: UserMessageType):
         message._is_azure = self._is_azure_openai
-        message_json = message.model_dump_json(exclude_unset=True)
-        await self.ws.send_str(message_json)
+        payload = dump_user_message(message)
+        # The payload is already UTF-8 JSON, send_frame (aiohttp >= 3.11) writes it as a text
+        # frame as is, where send_str would decode it and encode it back.
+        send_frame = getattr(self.ws, "send_frame", None)
+        if send_frame is not None:
+            await send_frame(payload, WSMsgType.TEXT)
+        else:
+            await self.ws.send_str(payload.decode())
 
     async def recv(self) -> ServerMessageType | None:
         if self.ws.closed:
             return None
         websocket_message = await self.ws.receive()
         if websocket_message.type == WSMsgType.TEXT:
-            data = json.loads(websocket_message.data)
-            msg = create_message_from_dict(data)
-            return msg
+            return create_message_from_json(websocket_message.data)
         else:
             return None
 
@@ -1,24 +1,53 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+"""
+Wire models for the realtime API.
+
+The TypeAdapters used to validate and serialize messages are built once at
+module scope. Building a TypeAdapter compiles its validator and serializer, so
+they must not be reconstructed per call; reuse the module-level adapters.
+"""
+
+import base64
+import logging
 from typing import Annotated, Any, Literal, Optional, Union
 
 from pydantic import (
     AliasChoices,
     BaseModel,
+    BeforeValidator,
+    ConfigDict,
     Field,
     SerializationInfo,
     SerializerFunctionWrapHandler,
+    Strict,
+    TypeAdapter,
+    ValidationError,
+    field_serializer,
     model_serializer,
 )
 
 from rtclient.util.model_helpers import ModelWithDefaults
 
+logger = logging.getLogger(__name__)
+
 Voice = Literal["alloy", "ash", "ballad", "coral", "echo", "sage", "shimmer", "verse"]
 AudioFormat = Literal["pcm16", "g711-ulaw", "g711-alaw"]
 Modality = Literal["text", "audio"]
 
 
+def _canonicalize_modalities(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        value = sorted(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(dict.fromkeys(value))
+    return value
+
+
+Modalities = Annotated[tuple[Modality, ...], BeforeValidator(_canonicalize_modalities)]
+
+
 class NoTurnDetection(ModelWithDefaults):
     type: Literal["none"] = "none"
 
@@ -40,6 +69,17 @@ class FunctionToolChoice(ModelWithDefaults):
 
 ToolChoice = Literal["auto", "none", "required"] | FunctionToolChoice
 
+
+class FunctionTool(ModelWithDefaults):
+    # Keys not declared here (e.g. newer tool options) are forwarded to the service as given.
+    model_config = ConfigDict(extra="allow")
+
+    type: Literal["function"] = "function"
+    name: str
+    description: Optional[str] = None
+    parameters: Optional[dict[str, Any]] = None
+
+
 MessageRole = Literal["system", "assistant", "user"]
 
 
@@ -53,14 +93,16 @@ class ClientMessageBase(ModelWithDefaults):
 
 
 Temperature = Annotated[float, Field(strict=True, ge=0.6, le=1.2)]
-ToolsDefinition = list[Any]
+ToolsDefinition = list[FunctionTool]
 
 MaxTokensType = Union[int, Literal["inf"]]
 
 
 class SessionUpdateParams(BaseModel):
+    model_config = ConfigDict(validate_assignment=True)
+
     model: Optional[str] = None
-    modalities: Optional[set[Modality]] = None
+    modalities: Optional[Modalities] = None
     voice: Optional[Voice] = None
     instructions: Optional[str] = None
     input_audio_format: Optional[AudioFormat] = None
@@ -95,14 +137,29 @@ class SessionUpdateMessage(ClientMessageBase):
         return serialized
 
 
+def _audio_buffer_to_bytes(value: Any) -> Any:
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return value
+
+
+AudioBytes = Annotated[bytes, Strict(), BeforeValidator(_audio_buffer_to_bytes)]
+
+
 class InputAudioBufferAppendMessage(ClientMessageBase):
     """
     Append audio data to the user audio buffer, this should be in the format specified by
-    input_audio_format in the session config.
+    input_audio_format in the session config. The raw audio bytes are base64 encoded when the
+    message is serialized. bytearray and memoryview buffers are accepted as bytes; an already
+    base64-encoded str is rejected rather than encoded twice.
     """
 
     type: Literal["input_audio_buffer.append"] = "input_audio_buffer.append"
-    audio: str
+    audio: AudioBytes
+
+    @field_serializer("audio")
+    def _serialize_audio(self, audio: bytes) -> str:
+        return base64.b64encode(audio).decode("ascii")
 
 
 class InputAudioBufferCommitMessage(ClientMessageBase):
@@ -219,7 +276,7 @@ class ResponseCreateParams(BaseModel):
     append_input_items: Optional[list[Item]] = None
     input_items: Optional[list[Item]] = None
     instructions: Optional[str] = None
-    modalities: Optional[set[Modality]] = None
+    modalities: Optional[Modalities] = None
     voice: Optional[Voice] = None
     temperature: Optional[Temperature] = None
     max_output_tokens: Optional[MaxTokensType] = None
@@ -250,6 +307,10 @@ class RealtimeError(BaseModel):
 
 
 class ServerMessageBase(BaseModel):
+    # Server messages are validated through _SERVER_MESSAGE_ADAPTER, which embeds their schemas,
+    # so skip building a standalone validator per message class unless one is actually used.
+    model_config = ConfigDict(defer_build=True)
+
     event_id: str
 
 
@@ -263,7 +324,7 @@ class UnknownMessage(ServerMessageBase):
 class Session(BaseModel):
     id: str
     model: str
-    modalities: set[Modality]
+    modalities: Modalities
     instructions: str
     voice: Voice
     input_audio_format: AudioFormat
@@ -513,15 +574,19 @@ class ResponseOutputItemDoneMessage(ServerMessageBase):
     item: ResponseItem
 
 
+# TODO: this alias won't be needed when AOAI and OAI are in sync.
+ResponseContentPartField = Annotated[
+    ResponseItemContentPart, Field(alias="part", validation_alias=AliasChoices("part", "content"))
+]
+
+
 class ResponseContentPartAddedMessage(ServerMessageBase):
     type: Literal["response.content_part.added"] = "response.content_part.added"
     response_id: str
     item_id: str
     output_index: int
     content_index: int
-    part: Annotated[
-        ResponseItemContentPart, Field(alias="part", validation_alias=AliasChoices("part", "content"))
-    ]  # TODO: this alias won't be needed when AOAI and OAI are in sync.
+    part: ResponseContentPartField
 
 
 class ResponseContentPartDoneMessage(ServerMessageBase):
@@ -530,9 +595,7 @@ class ResponseContentPartDoneMessage(ServerMessageBase):
     item_id: str
     output_index: int
     content_index: int
-    part: Annotated[
-        ResponseItemContentPart, Field(alias="part", validation_alias=AliasChoices("part", "content"))
-    ]  # TODO: this alias won't be needed when AOAI and OAI are in sync.
+    part: ResponseContentPartField
 
 
 class ResponseTextDeltaMessage(ServerMessageBase):
@@ -633,9 +696,16 @@ UserMessageType = Annotated[
     ],
     Field(discriminator="type"),
 ]
-ServerMessageType = Annotated[
+
+_USER_MESSAGE_ADAPTER = TypeAdapter(UserMessageType)
+
+
+def dump_user_message(message: UserMessageType) -> bytes:
+    return _USER_MESSAGE_ADAPTER.dump_json(message, exclude_unset=True)
+
+
+_TaggedServerMessageType = Annotated[
     Union[
-        UnknownMessage,
         ErrorMessage,
         SessionCreatedMessage,
         SessionUpdatedMessage,
@@ -667,67 +737,49 @@ ServerMessageType = Annotated[
     ],
     Field(discriminator="type"),
 ]
+ServerMessageType = Union[_TaggedServerMessageType, UnknownMessage]
+
+_SERVER_MESSAGE_ADAPTER = TypeAdapter(_TaggedServerMessageType)
+_validate_server_message = _SERVER_MESSAGE_ADAPTER.validate_python
+_validate_server_message_json = _SERVER_MESSAGE_ADAPTER.validate_json
+_validate_unknown_message = UnknownMessage.model_validate
+_validate_unknown_message_json = UnknownMessage.model_validate_json
+
+
+def _is_unknown_message_type(error: ValidationError) -> bool:
+    return any(
+        detail["loc"] == () and detail["type"] in ("union_tag_invalid", "union_tag_not_found")
+        for detail in error.errors(include_url=False)
+    )
+
+
+_logged_unknown_message_types: set[str] = set()
+
+
+def _log_unknown_message(event_type: str) -> None:
+    if event_type in _logged_unknown_message_types or not logger.isEnabledFor(logging.DEBUG):
+        return
+    _logged_unknown_message_types.add(event_type)
+    logger.debug("Unknown message type: %s", event_type)
 
 
 def create_message_from_dict(data: dict) -> ServerMessageType:
-    event_type = data.get("type")
-    match event_type:
-        case "error":
-            return ErrorMessage(**data)
-        case "session.created":
-            return SessionCreatedMessage(**data)
-        case "session.updated":
-            return SessionUpdatedMessage(**data)
-        case "input_audio_buffer.committed":
-            return InputAudioBufferCommittedMessage(**data)
-        case "input_audio_buffer.cleared":
-            return InputAudioBufferClearedMessage(**data)
-        case "input_audio_buffer.speech_started":
-            return InputAudioBufferSpeechStartedMessage(**data)
-        case "input_audio_buffer.speech_stopped":
-            return InputAudioBufferSpeechStoppedMessage(**data)
-        case "conversation.item.created":
-            return ItemCreatedMessage(**data)
-        case "conversation.item.truncated":
-            return ItemTruncatedMessage(**data)
-        case "conversation.item.deleted":
-            return ItemDeletedMessage(**data)
-        case "conversation.item.input_audio_transcription.delta":
-            return ItemInputAudioTranscriptionDeltaMessage(**data)
-        case "conversation.item.input_audio_transcription.completed":
-            return ItemInputAudioTranscriptionCompletedMessage(**data)
-        case "conversation.item.input_audio_transcription.failed":
-            return ItemInputAudioTranscriptionFailedMessage(**data)
-        case "response.created":
-            return ResponseCreatedMessage(**data)
-        case "response.done":
-            return ResponseDoneMessage(**data)
-        case "response.output_item.added":
-            return ResponseOutputItemAddedMessage(**data)
-        case "response.output_item.done":
-            return ResponseOutputItemDoneMessage(**data)
-        case "response.content_part.added":
-            return ResponseContentPartAddedMessage(**data)
-        case "response.content_part.done":
-            return ResponseContentPartDoneMessage(**data)
-        case "response.text.delta":
-            return ResponseTextDeltaMessage(**data)
-        case "response.text.done":
-            return ResponseTextDoneMessage(**data)
-        case "response.audio_transcript.delta":
-            return ResponseAudioTranscriptDeltaMessage(**data)
-        case "response.audio_transcript.done":
-            return ResponseAudioTranscriptDoneMessage(**data)
-        case "response.audio.delta":
-            return ResponseAudioDeltaMessage(**data)
-        case "response.audio.done":
-            return ResponseAudioDoneMessage(**data)
-        case "response.function_call_arguments.delta":
-            return ResponseFunctionCallArgumentsDeltaMessage(**data)
-        case "response.function_call_arguments.done":
-            return ResponseFunctionCallArgumentsDoneMessage(**data)
-        case "rate_limits.updated":
-            return RateLimitsUpdatedMessage(**data)
-        case _:
-            print (f"Unknown message type: {event_type}, data: {data}")
-            return UnknownMessage(**data)
+    try:
+        return _validate_server_message(data)
+    except ValidationError as error:
+        if not _is_unknown_message_type(error):
+            raise
+    message = _validate_unknown_message(data)
+    _log_unknown_message(message.type)
+    return message
+
+
+def create_message_from_json(data: Union[str, bytes]) -> ServerMessageType:
+    try:
+        return _validate_server_message_json(data)
+    except ValidationError as error:
+        if not _is_unknown_message_type(error):
+            raise
+    message = _validate_unknown_message_json(data)
+    _log_unknown_message(message.type)
+    return message
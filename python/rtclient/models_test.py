@@ -0,0 +1,181 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import logging
+
+import pytest
+from pydantic import ValidationError
+
+from rtclient.models import (
+    ErrorMessage,
+    FunctionTool,
+    InputAudioBufferAppendMessage,
+    InputTextContentPart,
+    ItemCreateMessage,
+    NoTurnDetection,
+    ResponseAudioDeltaMessage,
+    ResponseContentPartAddedMessage,
+    SessionUpdateMessage,
+    SessionUpdateParams,
+    UnknownMessage,
+    UserMessageItem,
+    create_message_from_dict,
+    create_message_from_json,
+    dump_user_message,
+)
+
+
+def test_create_known_message():
+    message = create_message_from_dict(
+        {
+            "type": "response.audio.delta",
+            "event_id": "event-1",
+            "response_id": "response-1",
+            "item_id": "item-1",
+            "output_index": 0,
+            "content_index": 0,
+            "delta": "AAAA",
+        }
+    )
+    assert isinstance(message, ResponseAudioDeltaMessage)
+    assert message.delta == "AAAA"
+
+
+def test_create_error_message():
+    message = create_message_from_dict(
+        {"type": "error", "event_id": "event-1", "error": {"message": "Something went wrong"}}
+    )
+    assert isinstance(message, ErrorMessage)
+    assert message.error.message == "Something went wrong"
+
+
+def test_create_message_with_validation_alias():
+    message = create_message_from_dict(
+        {
+            "type": "response.content_part.added",
+            "event_id": "event-1",
+            "response_id": "response-1",
+            "item_id": "item-1",
+            "output_index": 0,
+            "content_index": 0,
+            "content": {"type": "text", "text": ""},
+        }
+    )
+    assert isinstance(message, ResponseContentPartAddedMessage)
+    assert message.part.type == "text"
+
+
+def test_create_unknown_message():
+    message = create_message_from_dict({"type": "some.new.event", "event_id": "event-1"})
+    assert isinstance(message, UnknownMessage)
+    assert message.type == "some.new.event"
+
+
+def test_create_message_without_type():
+    message = create_message_from_dict({"event_id": "event-1"})
+    assert isinstance(message, UnknownMessage)
+    assert message.type == "unknown"
+
+
+def test_create_invalid_known_message_raises():
+    with pytest.raises(ValidationError):
+        create_message_from_dict({"type": "error", "event_id": "event-1"})
+
+
+def test_create_message_from_json():
+    message = create_message_from_json(
+        b'{"type": "error", "event_id": "event-1", "error": {"message": "Something went wrong"}}'
+    )
+    assert isinstance(message, ErrorMessage)
+    assert message.error.message == "Something went wrong"
+
+
+def test_create_unknown_message_from_json():
+    message = create_message_from_json('{"type": "some.new.event", "event_id": "event-1"}')
+    assert isinstance(message, UnknownMessage)
+    assert message.type == "some.new.event"
+
+
+def test_dump_user_message():
+    message = ItemCreateMessage(item=UserMessageItem(content=[InputTextContentPart(text="Hello")]))
+    assert dump_user_message(message) == (
+        b'{"type":"conversation.item.create",'
+        b'"item":{"type":"message","role":"user","content":[{"type":"input_text","text":"Hello"}]}}'
+    )
+
+
+def test_dump_session_update_without_turn_detection():
+    message = SessionUpdateMessage(session=SessionUpdateParams(turn_detection=NoTurnDetection()))
+    assert dump_user_message(message) == b'{"type":"session.update","session":{"turn_detection":null}}'
+
+
+def test_dump_session_update_without_turn_detection_for_azure():
+    message = SessionUpdateMessage(session=SessionUpdateParams(turn_detection=NoTurnDetection()))
+    message._is_azure = True
+    assert dump_user_message(message) == b'{"type":"session.update","session":{"turn_detection":{"type":"none"}}}'
+
+
+def test_dump_input_audio_buffer_append_encodes_audio():
+    message = InputAudioBufferAppendMessage(audio=b"\x00\x01\x02\x03")
+    assert dump_user_message(message) == b'{"type":"input_audio_buffer.append","audio":"AAECAw=="}'
+
+
+def test_dump_input_audio_buffer_append_accepts_buffers():
+    expected = dump_user_message(InputAudioBufferAppendMessage(audio=b"\x00\x01\x02\x03"))
+    for audio in (bytearray(b"\x00\x01\x02\x03"), memoryview(b"\x00\x01\x02\x03")):
+        assert dump_user_message(InputAudioBufferAppendMessage(audio=audio)) == expected
+
+
+def test_input_audio_buffer_append_rejects_base64_str():
+    with pytest.raises(ValidationError):
+        InputAudioBufferAppendMessage(audio="AAECAw==")
+
+
+def test_session_update_modalities_are_canonical():
+    params = SessionUpdateParams(modalities={"text", "audio"})
+    assert params.modalities == ("audio", "text")
+    params.modalities = ["text", "text"]
+    assert params.modalities == ("text",)
+
+
+def test_dump_session_update_modalities():
+    message = SessionUpdateMessage(session=SessionUpdateParams(modalities={"text", "audio"}))
+    assert dump_user_message(message) == b'{"type":"session.update","session":{"modalities":["audio","text"]}}'
+
+
+def test_dump_session_update_tools():
+    params = SessionUpdateParams()
+    params.tools = [{"type": "function", "name": "get_weather", "parameters": {"type": "object"}}]
+    assert isinstance(params.tools[0], FunctionTool)
+    message = SessionUpdateMessage(session=params)
+    assert dump_user_message(message) == (
+        b'{"type":"session.update","session":{"tools":'
+        b'[{"type":"function","name":"get_weather","parameters":{"type":"object"}}]}}'
+    )
+
+
+def test_dump_session_update_tools_keeps_extra_keys():
+    params = SessionUpdateParams()
+    params.tools = [{"type": "function", "name": "get_weather", "strict": True}]
+    message = SessionUpdateMessage(session=params)
+    assert dump_user_message(message) == (
+        b'{"type":"session.update","session":{"tools":[{"type":"function","name":"get_weather","strict":true}]}}'
+    )
+
+
+def test_unknown_message_type_is_logged_once(caplog):
+    with caplog.at_level(logging.DEBUG, logger="rtclient.models"):
+        create_message_from_dict({"type": "some.logged.event", "event_id": "event-1", "payload": "x" * 100})
+        create_message_from_dict({"type": "some.logged.event", "event_id": "event-2"})
+    assert [record.getMessage() for record in caplog.records] == ["Unknown message type: some.logged.event"]
+
+
+def test_client_models_are_frozen():
+    item = UserMessageItem(content=[InputTextContentPart(text="Hello")])
+    with pytest.raises(ValidationError):
+        item.id = "item-1"
+    copied = item.model_copy(update={"id": "item-1"})
+    assert dump_user_message(ItemCreateMessage(item=copied)) == (
+        b'{"type":"conversation.item.create","item":{"type":"message","role":"user","id":"item-1",'
+        b'"content":[{"type":"input_text","text":"Hello"}]}}'
+    )
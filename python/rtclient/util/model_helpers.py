@@ -1,14 +1,17 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT license.
 
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, ConfigDict, model_validator
 
 
 class ModelWithDefaults(BaseModel):
+    model_config = ConfigDict(frozen=True, populate_by_name=True, extra="ignore")
+
     @model_validator(mode="after")
     def _add_defaults(self):
-        for field in self.model_fields:
-            if self.model_fields[field].default is not None:
-                if not hasattr(self, field) or getattr(self, field) == self.model_fields[field].default:
-                    setattr(self, field, self.model_fields[field].default)
+        # Mark fields with non-None defaults as set so they are kept when serializing with
+        # exclude_unset. The model is frozen, so update the set directly instead of assigning.
+        for field, info in type(self).model_fields.items():
+            if info.default is not None and not info.is_required() and info.default_factory is None:
+                self.__pydantic_fields_set__.add(field)
         return self
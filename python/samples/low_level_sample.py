@@ -2,7 +2,6 @@
 # Licensed under the MIT license.
 
 import asyncio
-import base64
 import os
 import sys
 
@@ -54,8 +53,7 @@ async def send_audio(client: RTLowLevelClient, audio_file_path: str):
 
     for i in range(0, len(audio_bytes), bytes_per_chunk):
         chunk = audio_bytes[i : i + bytes_per_chunk]
-        base64_audio = base64.b64encode(chunk).decode("utf-8")
-        await client.send(InputAudioBufferAppendMessage(audio=base64_audio))
+        await client.send(InputAudioBufferAppendMessage(audio=chunk))
 
 
 async def receive_messages(client: RTLowLevelClient):
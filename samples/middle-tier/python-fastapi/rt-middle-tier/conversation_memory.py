@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+MAX_SESSIONS = 10_000
+MAX_TURNS = 10
+MAX_CHARS = 16_384
+
+Turn = tuple[str, str]
+
+
+class ConversationMemory:
+    """Recent (prompt, response) turns per session, bounded in size.
+
+    Sessions are evicted least recently used first once there are more than
+    ``max_sessions``. Each session keeps at most its ``max_turns`` newest turns,
+    and only as many of those as fit in ``max_chars`` characters.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        max_turns: int = MAX_TURNS,
+        max_chars: int = MAX_CHARS,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self._sessions: OrderedDict[str, list[Turn]] = OrderedDict()
+
+    def get(self, session_id: str) -> list[Turn]:
+        """Return a copy of the session's turns, oldest first."""
+        history = self._sessions.get(session_id)
+        if history is None:
+            return []
+        self._sessions.move_to_end(session_id)
+        return list(history)
+
+    def append(self, session_id: str, prompt: str, response: str) -> None:
+        """Record a turn, trimming the session and evicting idle sessions."""
+        history = self._sessions.pop(session_id, [])
+        history.append((prompt, response))
+
+        kept = 0
+        chars = 0
+        for question, answer in reversed(history[-self.max_turns :]):
+            chars += len(question) + len(answer)
+            if chars > self.max_chars:
+                break
+            kept += 1
+        history = history[len(history) - kept :]
+
+        if history:
+            self._sessions[session_id] = history
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
@@ -0,0 +1,143 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import BinaryIO
+
+# The parser libraries are imported where they are used: each is only needed
+# for its file type, and PDF worker processes only need pypdf.
+
+
+SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".md", ".docx", ".doc", ".xls", ".xlsx"}
+COPY_BUFFER_SIZE = 1 << 20
+# PDFs with at least this many pages are extracted by a pool of processes.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+
+_pdf_pool: ProcessPoolExecutor | None = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawn rather than fork: the server process runs threads (the
+            # event loop's executor, torch) that must not be forked mid-operation.
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+
+def shutdown() -> None:
+    """Stop the PDF worker processes, if they were started."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(cancel_futures=True)
+            _pdf_pool = None
+
+
+def _extract_pages(path: str, start: int, stop: int) -> list[str]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[index].extract_text() for index in range(start, stop)]
+
+
+def _extract_pdf(file: BinaryIO) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(file)
+    page_count = len(reader.pages)
+    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+        return "\n".join(
+            page.extract_text() for page in reader.pages if page.extract_text()
+        )
+
+    # Workers reopen the PDF by path, so spill uploads still held in memory.
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        file.seek(0)
+        _copy_to(file, tmp)
+        # A few ranges per worker balances pages that take longer to extract.
+        step = math.ceil(page_count / (PDF_WORKERS * 4))
+        starts = range(0, page_count, step)
+        stops = [min(start + step, page_count) for start in starts]
+        ranges = _get_pdf_pool().map(_extract_pages, repeat(tmp.name), starts, stops)
+        return "\n".join(text for texts in ranges for text in texts if text)
+
+
+def _copy_to(file: BinaryIO, tmp: BinaryIO) -> None:
+    shutil.copyfileobj(file, tmp, COPY_BUFFER_SIZE)
+    tmp.flush()
+
+
+async def _extract_doc(file: BinaryIO) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".doc") as tmp:
+        await asyncio.to_thread(_copy_to, file, tmp)
+        process = await asyncio.create_subprocess_exec(
+            "antiword",
+            tmp.name,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await process.communicate()
+        return stdout.decode()
+
+
+def _cell_text(value) -> str:
+    # Numeric cells are read as floats; print whole numbers without ".0".
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _extract_workbook(file: BinaryIO) -> str:
+    from python_calamine import CalamineWorkbook
+
+    workbook = CalamineWorkbook.from_filelike(file)
+    lines = []
+    for name in workbook.sheet_names:
+        for row in workbook.get_sheet_by_name(name).iter_rows():
+            # Empty cells are read as "", but a 0 cell is still text.
+            line = " ".join(_cell_text(value) for value in row if value != "")
+            if line:
+                lines.append(line)
+    return "\n".join(lines)
+
+
+def _extract_text_sync(file: BinaryIO, ext: str) -> str:
+    if ext == ".pdf":
+        return _extract_pdf(file)
+    if ext == ".txt":
+        return file.read().decode("utf-8", errors="ignore")
+    if ext == ".md":
+        import markdown
+        from bs4 import BeautifulSoup
+
+        html = markdown.markdown(file.read().decode("utf-8", errors="ignore"))
+        return BeautifulSoup(html, "html.parser").get_text()
+    if ext == ".docx":
+        import docx2txt
+
+        return docx2txt.process(file)
+    if ext in {".xls", ".xlsx"}:
+        return _extract_workbook(file)
+    raise ValueError(f"Unsupported file format: {ext}")
+
+
+async def extract_text(file: BinaryIO, ext: str) -> str:
+    """Extract plain text from an uploaded file without blocking the event loop.
+
+    Parsers read from the file object directly, so a large upload spooled to
+    disk is never copied into memory as a whole.
+    """
+    if ext == ".doc":
+        return await _extract_doc(file)
+    return await asyncio.to_thread(_extract_text_sync, file, ext)
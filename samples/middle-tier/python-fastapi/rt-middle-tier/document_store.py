@@ -1,14 +1,52 @@
+import asyncio
+import functools
+import hashlib
 import os
-from typing import List
-from loguru import logger
-from sentence_transformers import SentenceTransformer, util
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import weaviate
+from loguru import logger
+from weaviate.classes.config import Configure, DataType, Property
 from weaviate.classes.data import DataObject
-from weaviate.classes.config import Configure, Property, DataType
 from weaviate.classes.init import Auth
+from weaviate.classes.query import Filter
+from weaviate.util import generate_uuid5
+
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE") or None
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_MODEL_FILE = os.getenv("EMBEDDING_MODEL_FILE")
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Return the shared embedding model, loading it on first use.
 
+    Loading is deferred so workers that never search or index documents do not
+    import sentence-transformers or hold the model in memory.
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            from sentence_transformers import SentenceTransformer
+
+            # The device is picked automatically (CUDA, MPS or CPU) unless
+            # EMBEDDING_DEVICE is set.
+            _embedder = SentenceTransformer(
+                "all-MiniLM-L6-v2",
+                device=EMBEDDING_DEVICE,
+                backend=EMBEDDING_BACKEND,
+                model_kwargs=(
+                    {"file_name": EMBEDDING_MODEL_FILE}
+                    if EMBEDDING_MODEL_FILE
+                    else None
+                ),
+            )
+        return _embedder
 
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
 
 WEAVIATE_HOST = os.getenv("WEAVIATE_HOST")
 WEAVIATE_PORT = int(os.getenv("WEAVIATE_PORT", "0"))
@@ -18,88 +56,327 @@ WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
 WEAVIATE_GRPC_SECURE = bool(os.getenv("WEAVIATE_GRPC_SECURE"))
 WEAVIATE_AUTH_CREDENTIALS = os.getenv("WEAVIATE_AUTH_CREDENTIALS")
 
-weaviate_client = None
+COLLECTION_NAME = "DocumentChunk"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+ENCODE_BATCH_SIZE = 128
+INSERT_BATCH_SIZE = 100
+INSERT_CONCURRENCY = 2
+SCORE_BLOCK_ROWS = 1024
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+QUERY_CACHE_SIZE = 2048
 
 
-def get_weaviate_client():
-    """Initialize and return a Weaviate client instance."""
-    global weaviate_client
-    if weaviate_client is None:
-        try:
-            logger.info(
-                "Connecting to Weaviate at %s:%s secure=%s",
-                WEAVIATE_HOST,
-                WEAVIATE_PORT,
-                WEAVIATE_SECURE,
-            )
-            weaviate_client = weaviate.connect_to_custom(
-                http_host=WEAVIATE_HOST,
-                http_port=WEAVIATE_PORT,
-                http_secure=WEAVIATE_SECURE,
-                grpc_host=WEAVIATE_GRPC_HOST,
-                grpc_port=WEAVIATE_GRPC_PORT,
-                grpc_secure=WEAVIATE_GRPC_SECURE,
-                auth_credentials=Auth.api_key(WEAVIATE_AUTH_CREDENTIALS),
-            )
-        except Exception as exc:
-            logger.warning(f"Could not connect to Weaviate: {exc}")
-    return weaviate_client
+async def connect_weaviate() -> weaviate.WeaviateAsyncClient | None:
+    """Connect an async Weaviate client, or return None if it is unreachable."""
+    logger.info(
+        "Connecting to Weaviate at {}:{} secure={}",
+        WEAVIATE_HOST,
+        WEAVIATE_PORT,
+        WEAVIATE_SECURE,
+    )
+    try:
+        client = weaviate.use_async_with_custom(
+            http_host=WEAVIATE_HOST,
+            http_port=WEAVIATE_PORT,
+            http_secure=WEAVIATE_SECURE,
+            grpc_host=WEAVIATE_GRPC_HOST,
+            grpc_port=WEAVIATE_GRPC_PORT,
+            grpc_secure=WEAVIATE_GRPC_SECURE,
+            auth_credentials=Auth.api_key(WEAVIATE_AUTH_CREDENTIALS),
+        )
+        await client.connect()
+        return client
+    except Exception as exc:
+        logger.warning("Could not connect to Weaviate: {}", exc)
+        return None
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def encode_query(query: str) -> np.ndarray:
+    """Return the normalized embedding of a search query.
+
+    Embeddings are cached by query text and shared between callers, so the
+    returned array is read-only.
+    """
+    embedding = get_embedder().encode(
+        query, convert_to_numpy=True, normalize_embeddings=True
+    )
+    embedding.flags.writeable = False
+    return embedding
+
+
+async def embed_query(query: str) -> np.ndarray:
+    """Return ``encode_query(query)`` computed in a worker thread.
+
+    The first call loads the model, and encoding is CPU-bound, so neither may
+    run on the event loop that serves the realtime websockets.
+    """
+    return await asyncio.to_thread(encode_query, query)
+
+
+_SENTENCE_END_CODES = np.array([ord(c) for c in ".?!\n"], dtype=np.uint32)
+_WHITESPACE_CODES = np.array([ord(c) for c in " \t\r\n"], dtype=np.uint32)
+
+
+def _last_in(positions: np.ndarray, low: int, high: int) -> int | None:
+    """Return the largest position in ``(low, high]``, if any."""
+    index = np.searchsorted(positions, high, side="right") - 1
+    if index >= 0 and positions[index] > low:
+        return int(positions[index])
+    return None
+
+
+def _first_in(positions: np.ndarray, low: int, high: int) -> int | None:
+    """Return the smallest position in ``[low, high)``, if any."""
+    index = np.searchsorted(positions, low, side="left")
+    if index < len(positions) and positions[index] < high:
+        return int(positions[index])
+    return None
+
+
+def quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Quantize rows to int8 codes and the float32 scales that restore them."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _check_inserted(result) -> None:
+    if result.has_errors:
+        error = next(iter(result.errors.values()))
+        raise RuntimeError(
+            f"{len(result.errors)} chunks failed to insert: {error.message}"
+        )
+
+
+def split_into_chunks(
+    text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP
+) -> list[str]:
+    """Split text into chunks of at most ``size`` characters.
+
+    Chunks end after a sentence when possible, otherwise after a word, and
+    consecutive chunks share up to ``overlap`` characters starting at a word.
+    """
+    # One code point per element, so indices are offsets into ``text``.
+    codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    sentence_ends = np.flatnonzero(np.isin(codes, _SENTENCE_END_CODES)) + 1
+    word_starts = np.flatnonzero(np.isin(codes, _WHITESPACE_CODES)) + 1
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = len(text)
+        if start + size < len(text):
+            # Ending past the overlap guarantees the next chunk starts later.
+            end = _last_in(sentence_ends, start + overlap, start + size)
+            if end is None:
+                end = _last_in(word_starts, start + overlap, start + size)
+            if end is None:
+                end = start + size
+        chunk = text[start:end]
+        if chunk.strip():
+            chunks.append(chunk)
+        if end == len(text):
+            break
+        next_start = _first_in(word_starts, end - overlap, end)
+        start = end if next_start is None else next_start
+    return chunks
 
 
 class DocumentStore:
     """Manage document chunks and semantic search."""
 
-    def __init__(self) -> None:
-        self.chunks: List[str] = []
-        self.embeddings = []
-        self.client = get_weaviate_client()
+    def __init__(self, client: weaviate.WeaviateAsyncClient | None = None) -> None:
+        self.chunks: list[str] = []
+        # int8 codes of the chunk embeddings; row i is embeddings[i] * embedding_scales[i].
+        self.embeddings = np.empty((0, 0), dtype=np.int8)
+        self.embedding_scales = np.empty(0, dtype=np.float32)
+        self.client = client
+        # Quantized embeddings keyed by the SHA-256 digest of the chunk text, in LRU order.
+        self._embedding_cache: OrderedDict[bytes, tuple[np.ndarray, float]] = (
+            OrderedDict()
+        )
+        # Digests of the chunks stored in Weaviate, None until the collection is rebuilt.
+        self._stored_digests: set[bytes] | None = None
+        # Serializes updates, which share the embedding cache and the collection.
+        self._update_lock = asyncio.Lock()
 
-    def update(self, text: str) -> None:
-        """Split, embed, and store chunks from a document."""
-        self.chunks = [text[i : i + 500] for i in range(0, len(text), 500)]
-        self.embeddings = embedder.encode(self.chunks)
+    def _embed(
+        self, chunks: list[str], digests: list[bytes]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Embed the chunks, encoding only those missing from the cache."""
+        missing: dict[bytes, str] = {}
+        for digest, chunk in zip(digests, chunks):
+            if digest in self._embedding_cache:
+                self._embedding_cache.move_to_end(digest)
+            else:
+                missing.setdefault(digest, chunk)
 
-        if self.client is None:
-            logger.warning("Weaviate client not initialized, skipping storage")
-            return
+        if missing:
+            vectors = get_embedder().encode(
+                list(missing.values()),
+                batch_size=ENCODE_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+            # A quarter of the float32 size; per-row int8 keeps the top-k ranking.
+            codes, scales = quantize(vectors)
+            self._embedding_cache.update(zip(missing, zip(codes, scales.tolist())))
+            logger.info("Embedded {} new chunks", len(missing))
 
+        entries = [self._embedding_cache[digest] for digest in digests]
+        codes = np.stack([code for code, _ in entries])
+        scales = np.array([scale for _, scale in entries], dtype=np.float32)
+        while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+        return codes, scales
+
+    async def _reset_collection(self) -> None:
         try:
-            try:
-                self.client.collections.delete("DocumentChunk")
-            except Exception:
-                logger.debug("No existing DocumentChunk collection to delete")
-
-            self.client.collections.create(
-                name="DocumentChunk",
-                description="Document chunks for semantic search",
-                properties=[Property(name="text", data_type=DataType.TEXT)],
-                vectorizer_config=Configure.Vectorizer.none(),
+            await self.client.collections.delete(COLLECTION_NAME)
+        except Exception:
+            logger.debug("No existing DocumentChunk collection to delete")
+
+        await self.client.collections.create(
+            name=COLLECTION_NAME,
+            description="Document chunks for semantic search",
+            properties=[Property(name="text", data_type=DataType.TEXT)],
+            vectorizer_config=Configure.Vectorizer.none(),
+        )
+        self._stored_digests = set()
+
+    async def _store(self, digests: list[bytes]) -> None:
+        """Sync Weaviate with the current chunks, touching only changed rows."""
+        if self._stored_digests is None:
+            await self._reset_collection()
+        collection = self.client.collections.get(COLLECTION_NAME)
+
+        positions = {digest: index for index, digest in enumerate(digests)}
+        removed = self._stored_digests - positions.keys()
+        if removed:
+            await collection.data.delete_many(
+                where=Filter.by_id().contains_any(
+                    [generate_uuid5(digest.hex()) for digest in removed]
+                )
             )
-            collection = self.client.collections.get("DocumentChunk")
-            objects = [
-                DataObject(properties={"text": chunk}, vector=vector.tolist())
-                for chunk, vector in zip(self.chunks, self.embeddings)
-            ]
-            collection.data.insert_many(objects)
-            logger.info("Stored document chunks in Weaviate")
-        except Exception as exc:
-            logger.warning(f"Failed to store in Weaviate: {exc}")
-
-    def search(self, query: str) -> str:
+
+        added = [
+            (digest, index)
+            for digest, index in positions.items()
+            if digest not in self._stored_digests
+        ]
+        await self._insert(collection, added)
+        self._stored_digests = set(positions)
+        logger.info(
+            "Stored document chunks in Weaviate ({} added, {} removed)",
+            len(added),
+            len(removed),
+        )
+
+    async def _insert(self, collection, added: list[tuple[bytes, int]]) -> None:
+        """Insert chunks one slice at a time, with a few slices in flight.
+
+        Each slice is built while the previous ones are being sent, and only
+        INSERT_CONCURRENCY slices of vectors exist as Python lists at once.
+        """
+        in_flight: set[asyncio.Task] = set()
+        try:
+            for start in range(0, len(added), INSERT_BATCH_SIZE):
+                if len(in_flight) >= INSERT_CONCURRENCY:
+                    done, in_flight = await asyncio.wait(
+                        in_flight, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        _check_inserted(task.result())
+                objects = [
+                    DataObject(
+                        properties={"text": self.chunks[index]},
+                        vector=(
+                            self.embeddings[index] * self.embedding_scales[index]
+                        ).tolist(),
+                        uuid=generate_uuid5(digest.hex()),
+                    )
+                    for digest, index in added[start : start + INSERT_BATCH_SIZE]
+                ]
+                in_flight.add(asyncio.create_task(collection.data.insert_many(objects)))
+            for result in await asyncio.gather(*in_flight):
+                _check_inserted(result)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def update(self, text: str) -> None:
+        """Split, embed, and store chunks from a document."""
+        async with self._update_lock:
+            chunks = split_into_chunks(text)
+            digests = [hashlib.sha256(chunk.encode()).digest() for chunk in chunks]
+            # Encoding is compute-bound, keep it off the event loop.
+            embeddings = np.empty((0, 0), dtype=np.int8)
+            scales = np.empty(0, dtype=np.float32)
+            if digests:
+                embeddings, scales = await asyncio.to_thread(
+                    self._embed, chunks, digests
+                )
+            # Swap together so a concurrent search never sees mismatched rows.
+            self.chunks = chunks
+            self.embeddings, self.embedding_scales = embeddings, scales
+
+            if self.client is None:
+                logger.warning("Weaviate client not initialized, skipping storage")
+                return
+
+            try:
+                await self._store(digests)
+            except Exception as exc:
+                # The collection state is unknown, rebuild it on the next update.
+                self._stored_digests = None
+                logger.warning("Failed to store in Weaviate: {}", exc)
+
+    def _scores(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Score every chunk against the query, dequantizing one block at a time."""
+        count, dim = self.embeddings.shape
+        scores = np.empty(count, dtype=np.float32)
+        # A cache-sized float32 block instead of a full float32 copy of the codes.
+        block = np.empty((min(count, SCORE_BLOCK_ROWS), dim), dtype=np.float32)
+        query_embedding = query_embedding.astype(np.float32, copy=False)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            codes = self.embeddings[start : start + SCORE_BLOCK_ROWS]
+            rows = block[: len(codes)]
+            np.copyto(rows, codes, casting="unsafe")
+            np.dot(rows, query_embedding, out=scores[start : start + len(codes)])
+        scores *= self.embedding_scales
+        return scores
+
+    def _top_chunks(self, query_embedding: np.ndarray, k: int = 3) -> list[str]:
+        """Return the k chunks closest to the normalized query embedding."""
+        scores = self._scores(query_embedding)
+        top = np.arange(len(scores))
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.chunks[index] for index in top]
+
+    async def search(
+        self, query: str, query_embedding: np.ndarray | None = None
+    ) -> str:
         """Retrieve relevant context for the query."""
-        if self.client is not None and self.client.collections.exists("DocumentChunk"):
-            collection = self.client.collections.get("DocumentChunk")
-            query_embedding = embedder.encode(query)
+        if query_embedding is None:
+            query_embedding = await embed_query(query)
+        if self.client is not None and await self.client.collections.exists(
+            COLLECTION_NAME
+        ):
+            collection = self.client.collections.get(COLLECTION_NAME)
             try:
-                results = collection.query.near_vector(query_embedding.tolist(), limit=3)
+                results = await collection.query.near_vector(
+                    query_embedding.tolist(), limit=3
+                )
                 return "\n---\n".join(obj.properties["text"] for obj in results.objects)
             except Exception as exc:
-                logger.warning(f"Weaviate query failed: {exc}")
+                logger.warning("Weaviate query failed: {}", exc)
 
         if self.chunks and len(self.embeddings) > 0:
-            query_embedding = embedder.encode(query, convert_to_tensor=True)
-            top_results = util.semantic_search(query_embedding, self.embeddings, top_k=3)
-            return "\n---\n".join(
-                self.chunks[match["corpus_id"]] for match in top_results[0]
-            )
+            return "\n---\n".join(self._top_chunks(query_embedding))
         return ""
@@ -1,6 +1,18 @@
 import os
 from abc import ABC, abstractmethod
-from langchain_community.llms.ollama import Ollama
+
+import httpx
+import orjson
+
+HTTP_KEEPALIVE_CONNECTIONS = 32
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the client shared by all model requests, reusing pooled connections."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        limits=httpx.Limits(max_keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS),
+    )
 
 
 class BaseLLMModel(ABC):
@@ -18,25 +30,51 @@ class BaseLLMModel(ABC):
 
 
 class OllamaModel(BaseLLMModel):
-    def __init__(self, base_url: str, model: str) -> None:
-        self._client = Ollama(base_url=base_url, model=model)
+    """Model served by Ollama, called through its ``/api/generate`` endpoint."""
+
+    def __init__(
+        self, base_url: str, model: str, http_client: httpx.AsyncClient
+    ) -> None:
+        self._url = f"{base_url.rstrip('/')}/api/generate"
+        self._model = model
+        self._http = http_client
 
     async def generate(self, prompt: str) -> str:
-        return await self._client.apredict(prompt)
+        response = await self._http.post(
+            self._url, json={"model": self._model, "prompt": prompt, "stream": False}
+        )
+        response.raise_for_status()
+        return response.json()["response"]
 
     async def stream(self, prompt: str):
-        async for chunk in self._client.astream(prompt):
-            yield chunk
+        async with self._http.stream(
+            "POST",
+            self._url,
+            json={"model": self._model, "prompt": prompt, "stream": True},
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = orjson.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
 
 
 class ModelFactory:
     """Factory to create model instances."""
 
     @staticmethod
-    def create(model_name: str | None = None) -> BaseLLMModel:
+    def create(
+        model_name: str | None = None, *, http_client: httpx.AsyncClient
+    ) -> BaseLLMModel:
         model_name = model_name or os.getenv("LLM_PROVIDER", "ollama")
         if model_name == "ollama":
             base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
             model = os.getenv("PHI3_MODEL", "phi3.5:3.8b")
-            return OllamaModel(base_url=base_url, model=model)
+            return OllamaModel(base_url=base_url, model=model, http_client=http_client)
         raise ValueError(f"Unknown model provider: {model_name}")
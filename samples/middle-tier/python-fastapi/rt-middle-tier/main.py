@@ -1,34 +1,72 @@
-from fastapi import FastAPI, WebSocket, UploadFile, File
-from fastapi.responses import StreamingResponse
+import os
+import string
+from contextlib import asynccontextmanager
+
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, Request, UploadFile, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.websockets import WebSocketState
-from pydantic import BaseModel
 from loguru import logger
-import uvicorn
-import os
-import io
-import tempfile
-import subprocess
-from typing import Dict, List, Tuple
-import pandas as pd
-from bs4 import BeautifulSoup
-import markdown
-from pypdf import PdfReader
-import docx2txt
-from dotenv import load_dotenv
-import re
-
-from .document_store import DocumentStore
-from .llm import ModelFactory
-from .rt_session import RTSession
+from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
 
+from . import document_parser
+from .conversation_memory import ConversationMemory, Turn
+from .document_parser import SUPPORTED_EXTENSIONS, extract_text
+from .document_store import DocumentStore, connect_weaviate, embed_query
+from .llm import ModelFactory, create_http_client
+from .rt_session import BackendSettings, RTSession, create_credential, warm_credential
+from .semantic_cache import SemanticCache
+from .stream_utils import coalesce
 
 load_dotenv()
 
-# Simple in-memory storage for conversation history
-mem0: Dict[str, List[Tuple[str, str]]] = {}
+# Recent conversation turns per session, kept in memory.
+conversations = ConversationMemory()
 
 document_store = DocumentStore()
+# Responses to prompts asked without conversation history, reused for paraphrases.
+response_cache = SemanticCache()
+
+
+SSE_FLUSH_SIZE = 8192
+SSE_FLUSH_INTERVAL = 0.025
+
+_WHITESPACE_TO_SPACE = str.maketrans(string.whitespace, " " * len(string.whitespace))
+_PUNCTUATION = tuple(".,!?;:")
+
+
+def _flush_boundary(buffer: str) -> int:
+    """Return the length of the prefix of ``buffer`` made of complete words."""
+    if buffer.endswith(_PUNCTUATION):
+        return len(buffer)
+    end = buffer.translate(_WHITESPACE_TO_SPACE).rfind(" ") + 1
+    # Hold leading whitespace back until the word after it is complete.
+    return 0 if buffer[:end].isspace() else end
+
+
+_CONTEXT_PREFIX = "Use the following document excerpts to answer the question.\n\n"
+
+
+def _build_prompt(prompt: str, context: str, history: list[Turn]) -> str:
+    """Build the LLM prompt from the retrieved context, history and new prompt.
+
+    The parts that change least come first, so requests that retrieve the same
+    excerpts share a prompt prefix whose KV cache the model server can reuse.
+    """
+    parts = []
+    if context:
+        parts += (_CONTEXT_PREFIX, context, "\n\n")
+    for question, answer in history:
+        parts += ("User: ", question, "\nAssistant: ", answer, "\n")
+    if history:
+        parts += ("User: ", prompt, "\nAssistant:")
+    elif context:
+        parts += ("Question: ", prompt, "\nAnswer:")
+    else:
+        parts.append(prompt)
+    return "".join(parts)
 
 
 class Phi3Request(BaseModel):
@@ -36,7 +74,27 @@ class Phi3Request(BaseModel):
     session_id: str | None = None
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.http = create_http_client()
+    app.state.llm = ModelFactory.create(http_client=app.state.http)
+    # Read once here, after load_dotenv, rather than on every connection.
+    app.state.backend = BackendSettings.from_env()
+    app.state.credential = create_credential(app.state.backend.backend)
+    if app.state.credential is not None:
+        await warm_credential(app.state.credential)
+    app.state.weaviate = await connect_weaviate()
+    document_store.client = app.state.weaviate
+    yield
+    if app.state.weaviate is not None:
+        await app.state.weaviate.close()
+    document_parser.shutdown()
+    await app.state.http.aclose()
+    if app.state.credential is not None:
+        await app.state.credential.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -47,99 +105,68 @@ app.add_middleware(
 
 
 @app.post("/phi3")
-async def phi3_endpoint(req: Phi3Request):
-    global mem0
-    llm = ModelFactory.create()
+async def phi3_endpoint(req: Phi3Request, request: Request):
+    llm = request.app.state.llm
 
     session_id = req.session_id or "default"
-    history = mem0.get(session_id, [])
+    history = conversations.get(session_id)
 
-    context = document_store.search(req.prompt)
-    conversation = (
-        "\n".join(f"User: {q}\nAssistant: {a}" for q, a in history) if history else ""
-    )
+    query_embedding = await embed_query(req.prompt)
+    response = None if history else response_cache.get(req.prompt, query_embedding)
+    if response is not None:
+        logger.info("Serving cached response")
+        conversations.append(session_id, req.prompt, response)
+        return {"response": response}
 
-    if context:
-        final_prompt = (
-            "Use the following document excerpts to answer the question.\n\n"
-            f"{context}\n\n"
-        )
-        if conversation:
-            final_prompt += f"{conversation}\nUser: {req.prompt}\nAssistant:"
-        else:
-            final_prompt += f"Question: {req.prompt}\nAnswer:"
-    else:
-        final_prompt = (
-            f"{conversation}\nUser: {req.prompt}\nAssistant:"
-            if conversation
-            else req.prompt
-        )
+    context = await document_store.search(req.prompt, query_embedding)
+    final_prompt = _build_prompt(req.prompt, context, history)
 
-    logger.info(f"Final prompt for LLM: {final_prompt}")
+    logger.debug("Final prompt for LLM: {}", final_prompt)
     response = await llm.generate(final_prompt)
+    if not history:
+        response_cache.put(req.prompt, query_embedding, response)
 
-    history.append((req.prompt, response))
-    mem0[session_id] = history[-10:]
+    conversations.append(session_id, req.prompt, response)
 
     return {"response": response}
 
 
 @app.post("/phi3-stream")
-async def phi3_stream(req: Phi3Request):
+async def phi3_stream(req: Phi3Request, request: Request):
     """Stream phi3 response tokens using Server Sent Events."""
-    global mem0
-    llm = ModelFactory.create()
+    llm = request.app.state.llm
 
     session_id = req.session_id or "default"
-    history = mem0.get(session_id, [])
+    history = conversations.get(session_id)
 
-    context = document_store.search(req.prompt)
-    conversation = (
-        "\n".join(f"User: {q}\nAssistant: {a}" for q, a in history) if history else ""
-    )
-
-    if context:
-        final_prompt = (
-            "Use the following document excerpts to answer the question.\n\n"
-            f"{context}\n\n"
-        )
-        if conversation:
-            final_prompt += f"{conversation}\nUser: {req.prompt}\nAssistant:"
-        else:
-            final_prompt += f"Question: {req.prompt}\nAnswer:"
-    else:
-        final_prompt = (
-            f"{conversation}\nUser: {req.prompt}\nAssistant:"
-            if conversation
-            else req.prompt
-        )
+    context = await document_store.search(req.prompt)
+    final_prompt = _build_prompt(req.prompt, context, history)
 
-    logger.info(f"Streaming prompt for LLM: {final_prompt}")
+    logger.debug("Streaming prompt for LLM: {}", final_prompt)
 
     async def token_generator():
-        collected = ""
+        collected = []
         buffer = ""
-        pattern = re.compile(r"^\s*\S+[.,!?;:](?=\s|$)|^\s*\S+\s+")
         async for token in llm.stream(final_prompt):
             buffer += token
-            while True:
-                match = pattern.match(buffer)
-                if not match:
-                    break
-                piece = match.group(0)
-                buffer = buffer[len(piece) :]
-                collected += piece
-                yield f"data: {piece}\n\n"
+            end = _flush_boundary(buffer)
+            if end:
+                piece, buffer = buffer[:end], buffer[end:]
+                collected.append(piece)
+                yield piece
         if buffer:
-            collected += buffer
-            yield f"data: {buffer}\n\n"
-        history.append((req.prompt, collected))
-        mem0[session_id] = history[-10:]
+            collected.append(buffer)
+            yield buffer
+        conversations.append(session_id, req.prompt, "".join(collected))
 
     headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
-    return StreamingResponse(
-        token_generator(), media_type="text/event-stream", headers=headers
+    # Send the words that arrive within a short window as a single event.
+    pieces = coalesce(
+        token_generator(), flush_size=SSE_FLUSH_SIZE, max_delay=SSE_FLUSH_INTERVAL
     )
+    events = ({"data": text} async for text in pieces)
+    # The frontend splits events on blank lines made of "\n", not "\r\n".
+    return EventSourceResponse(events, headers=headers, sep="\n")
 
 
 @app.websocket("/realtime")
@@ -147,7 +174,9 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     logger.info("New WebSocket connection established")
 
-    async with RTSession(websocket, os.getenv("BACKEND")) as session:
+    async with RTSession(
+        websocket, websocket.app.state.backend, websocket.app.state.credential
+    ) as session:
         try:
             await session.initialize()
             while websocket.client_state != WebSocketState.DISCONNECTED:
@@ -157,7 +186,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 elif "text" in message:
                     await session.handle_text_message(message["text"])
         except Exception as exc:
-            logger.error(f"WebSocket error: {exc}")
+            logger.error("WebSocket error: {}", exc)
         finally:
             if websocket.client_state == WebSocketState.CONNECTED:
                 await websocket.close()
@@ -166,42 +195,20 @@ async def websocket_endpoint(websocket: WebSocket):
 
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    logger.info(f"Received file upload: {file.filename}")
+    logger.info("Received file upload: {}", file.filename)
 
-    contents = await file.read()
     ext = os.path.splitext(file.filename)[1].lower()
-
-    if ext == ".pdf":
-        reader = PdfReader(io.BytesIO(contents))
-        text = "\n".join(
-            page.extract_text() for page in reader.pages if page.extract_text()
-        )
-    elif ext == ".txt":
-        text = contents.decode("utf-8", errors="ignore")
-    elif ext == ".md":
-        md_text = contents.decode("utf-8", errors="ignore")
-        html = markdown.markdown(md_text)
-        text = BeautifulSoup(html, "html.parser").get_text()
-    elif ext == ".docx":
-        text = docx2txt.process(io.BytesIO(contents))
-    elif ext == ".doc":
-        with tempfile.NamedTemporaryFile(suffix=".doc") as tmp:
-            tmp.write(contents)
-            tmp.flush()
-            result = subprocess.run(
-                ["antiword", tmp.name], capture_output=True, text=True
-            )
-            text = result.stdout
-    elif ext in {".xls", ".xlsx"}:
-        df = pd.read_excel(io.BytesIO(contents), header=None, dtype=str)
-        text = "\n".join(
-            " ".join(filter(None, map(str, row.dropna()))) for _, row in df.iterrows()
-        )
-    else:
+    if ext not in SUPPORTED_EXTENSIONS:
         return {"error": "Unsupported file format."}
 
-    logger.info(f"File {file.filename} processed, extracted text length: {len(text)}")
-    document_store.update(text)
+    text = await extract_text(file.file, ext)
+
+    logger.info(
+        "File {} processed, extracted text length: {}", file.filename, len(text)
+    )
+    await document_store.update(text)
+    # Cached answers were grounded in the previous document.
+    response_cache.clear()
     return {
         "status": "Document uploaded and processed",
         "chunks": len(document_store.chunks),
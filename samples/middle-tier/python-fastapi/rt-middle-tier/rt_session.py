@@ -1,22 +1,53 @@
 import asyncio
-import json
+import contextlib
 import os
 import uuid
-from typing import Literal, TypedDict, Union
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Literal, TypedDict
 
+import orjson
 from azure.core.credentials import AzureKeyCredential
+from azure.core.credentials_async import AsyncTokenCredential
 from azure.identity.aio import DefaultAzureCredential
 from fastapi import WebSocket
 from loguru import logger
 from rtclient import (
     InputAudioTranscription,
+    InputTextContentPart,
+    RTAudioContent,
     RTClient,
-    ServerVAD,
     RTInputAudioItem,
     RTResponse,
-    RTAudioContent,
+    ServerVAD,
+    UserMessageItem,
 )
 
+from .stream_utils import coalesce
+
+# Audio chunks from the backend are small; merging them into larger binary
+# frames spreads the framing overhead over more payload. A frame is sent once
+# it reaches 16 KB, about a third of a second of 24 kHz pcm16, so the client
+# can start playback early; it may run over by the size of one backend chunk.
+AUDIO_FLUSH_SIZE = 16 * 1024
+AUDIO_FLUSH_INTERVAL = 0.02
+# Text deltas that arrive within a short window are sent as one text_delta;
+# clients append deltas, so the merged delta reads the same.
+TEXT_FLUSH_SIZE = 4096
+TEXT_FLUSH_INTERVAL = 0.01
+# Scope of the tokens RTClient requests for Azure OpenAI.
+TOKEN_SCOPE = "https://cognitiveservices.azure.com/.default"
+# Frames waiting for the writer. Once this many are queued, a new text delta
+# replaces the oldest queued one and other frames wait for room.
+OUTBOUND_QUEUE_SIZE = 512
+# Seconds between reports of dropped text deltas.
+DROP_LOG_INTERVAL = 5.0
+# A send that does not have to wait for the transport returns without
+# suspending, so the writer yields to the loop after this many frames or
+# seconds while it flushes a backlog.
+WRITER_YIELD_FRAMES = 16
+WRITER_YIELD_INTERVAL = 0.004
+
 
 class TextDelta(TypedDict):
     id: str
@@ -43,157 +74,370 @@ class ControlMessage(TypedDict):
     id: str | None = None
 
 
-WSMessage = Union[TextDelta, Transcription, UserMessage, ControlMessage]
+WSMessage = TextDelta | Transcription | UserMessage | ControlMessage
+# A text delta as (serialized frame prefix, delta).
+DeltaFrame = tuple[str, str]
+# A message to serialize, a text delta, an already serialized text frame, or audio.
+OutboundFrame = WSMessage | DeltaFrame | str | bytes
+
+
+# Constant messages, serialized once.
+_GREETING: str = orjson.dumps(
+    {
+        "type": "control",
+        "action": "connected",
+        "greeting": "You are now connected to the FastAPI server",
+    }
+).decode()
+_SPEECH_STARTED: str = orjson.dumps(
+    {"type": "control", "action": "speech_started"}
+).decode()
+_TEXT_DONE_PREFIX = '{"type":"control","action":"text_done","id":'
+
+
+def _encoded_content_id(content) -> str:
+    # orjson escapes the id, which comes from the backend.
+    return orjson.dumps(f"{content.item_id}-{content.content_index}").decode()
+
+
+def _delta_prefix(encoded_id: str) -> str:
+    """Return the serialized text_delta frame up to its delta value."""
+    return '{"id":' + encoded_id + ',"type":"text_delta","delta":'
+
+
+def _delta_frame(prefix: str, deltas: list[str]) -> str:
+    return prefix + orjson.dumps("".join(deltas)).decode() + "}"
+
+
+def _serialize(frames: list[OutboundFrame]) -> Iterator[str | bytes]:
+    """Serialize queued frames in order, merging runs of deltas for one content."""
+    run: list[str] = []
+    run_prefix = None
+    for frame in frames:
+        if isinstance(frame, tuple):
+            prefix, delta = frame
+            if run and prefix != run_prefix:
+                yield _delta_frame(run_prefix, run)
+                run = []
+            run_prefix = prefix
+            run.append(delta)
+            continue
+        if run:
+            yield _delta_frame(run_prefix, run)
+            run = []
+        yield orjson.dumps(frame).decode() if isinstance(frame, dict) else frame
+    if run:
+        yield _delta_frame(run_prefix, run)
+
+
+def uses_azure(backend: str | None) -> bool:
+    return backend == "azure" or backend is None
+
+
+@dataclass(frozen=True)
+class BackendSettings:
+    """Backend connection settings, read from the environment once at startup."""
+
+    backend: str | None
+    azure_endpoint: str | None
+    azure_deployment: str | None
+    openai_api_key: str | None
+    openai_model: str | None
+
+    @classmethod
+    def from_env(cls) -> "BackendSettings":
+        return cls(
+            backend=os.getenv("BACKEND"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            openai_model=os.getenv("OPENAI_MODEL"),
+        )
+
+
+def create_credential(backend: str | None) -> DefaultAzureCredential | None:
+    """Create the token credential shared by all sessions, if the backend needs one.
+
+    DefaultAzureCredential probes its credential chain and caches tokens per
+    instance, so one instance is created at startup and closed on shutdown.
+    """
+    return DefaultAzureCredential() if uses_azure(backend) else None
+
+
+async def warm_credential(credential: AsyncTokenCredential) -> None:
+    """Fetch a token now, so the first session does not probe the credential chain."""
+    try:
+        await credential.get_token(TOKEN_SCOPE)
+    except Exception as error:
+        logger.warning("Could not get an Azure token at startup: {}", error)
+
+
+class _OutboundQueue(asyncio.Queue):
+    """Queue of outbound frames that can give up its oldest text delta."""
+
+    def drop_oldest_delta(self) -> bool:
+        """Remove the oldest queued text delta, if there is one."""
+        for index, frame in enumerate(self._queue):
+            if isinstance(frame, tuple):
+                del self._queue[index]
+                return True
+        return False
 
 
 class RTSession:
     """Manage a realtime WebSocket session."""
 
-    def __init__(self, websocket: WebSocket, backend: str | None) -> None:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        settings: BackendSettings,
+        credential: AsyncTokenCredential | None = None,
+    ) -> None:
         self.session_id = str(uuid.uuid4())
         self.websocket = websocket
         self.logger = logger.bind(session_id=self.session_id)
-        self.credential: DefaultAzureCredential | None = None
-        self.client = self._initialize_client(backend)
+        # Owned by the application, which closes it on shutdown.
+        self.credential = credential
+        self.client = self._initialize_client(settings)
+        # Producers queue frames and a single writer task sends them, so they
+        # never wait on each other for the socket.
+        self._outbound: _OutboundQueue[OutboundFrame] = _OutboundQueue(
+            maxsize=OUTBOUND_QUEUE_SIZE
+        )
+        self._dropped_deltas = 0
+        self._drop_logged_at = float("-inf")
+        self._tasks: list[asyncio.Task] = []
+        self._exit_stack = contextlib.AsyncExitStack()
         self.logger.info("New session created")
 
     async def __aenter__(self):
-        if self.credential is not None:
-            await self.credential.__aenter__()
-        await self.client.__aenter__()
+        await self._exit_stack.enter_async_context(self.client)
+        # Unwound first, so the tasks stop before the client closes.
+        self._exit_stack.push_async_callback(self._cancel_tasks)
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
-        await self.client.__aexit__(exc_type, exc_value, traceback)
-        if self.credential is not None:
-            await self.credential.__aexit__(exc_type, exc_value, traceback)
-        self.logger.info("Session closed")
-
-    def _initialize_client(self, backend: str | None) -> RTClient:
-        self.logger.debug("Initializing RT client with backend: %s", backend)
-        if backend == "azure" or backend is None:
+        try:
+            await self._exit_stack.__aexit__(exc_type, exc_value, traceback)
+        finally:
+            self.logger.info("Session closed")
+
+    async def _cancel_tasks(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _initialize_client(self, settings: BackendSettings) -> RTClient:
+        self.logger.debug("Initializing RT client with backend: {}", settings.backend)
+        if uses_azure(settings.backend):
+            if self.credential is None:
+                raise ValueError("The Azure backend requires a token credential")
+            if settings.azure_endpoint is None:
+                raise ValueError("AZURE_OPENAI_ENDPOINT is not set")
             self.logger.info(
-                "Using Azure OpenAI backend at %s with deployment %s",
-                os.getenv("AZURE_OPENAI_ENDPOINT"),
-                os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+                "Using Azure OpenAI backend at {} with deployment {}",
+                settings.azure_endpoint,
+                settings.azure_deployment,
             )
-            self.credential = DefaultAzureCredential()
             return RTClient(
-                url=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                url=settings.azure_endpoint,
                 token_credential=self.credential,
-                azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+                azure_deployment=settings.azure_deployment,
             )
+        if settings.openai_api_key is None:
+            raise ValueError("OPENAI_API_KEY is not set")
         return RTClient(
-            key_credential=AzureKeyCredential(os.getenv("OPENAI_API_KEY")),
-            model=os.getenv("OPENAI_MODEL"),
+            key_credential=AzureKeyCredential(settings.openai_api_key),
+            model=settings.openai_model,
         )
 
     async def send(self, message: WSMessage) -> None:
-        await self.websocket.send_json(message)
+        await self._outbound.put(message)
+
+    async def send_delta(self, prefix: str, delta: str) -> None:
+        # Serialized by the writer, which merges consecutive deltas. A slow
+        # client loses its oldest text rather than stalling the response;
+        # audio and control frames are never dropped.
+        queue = self._outbound
+        if queue.full() and queue.drop_oldest_delta():
+            self._record_dropped_delta()
+            queue.put_nowait((prefix, delta))
+        else:
+            await queue.put((prefix, delta))
+
+    def _record_dropped_delta(self) -> None:
+        self._dropped_deltas += 1
+        now = asyncio.get_running_loop().time()
+        if now - self._drop_logged_at >= DROP_LOG_INTERVAL:
+            self._drop_logged_at = now
+            self.logger.warning(
+                "Client is not keeping up, dropped {} text deltas so far",
+                self._dropped_deltas,
+            )
+
+    async def send_text(self, message: str) -> None:
+        """Send serialized JSON as a text frame; binary frames carry audio."""
+        await self._outbound.put(message)
+
+    async def send_text_done(self, encoded_id: str) -> None:
+        await self.send_text(_TEXT_DONE_PREFIX + encoded_id + "}")
 
     async def send_binary(self, message: bytes) -> None:
-        await self.websocket.send_bytes(message)
+        await self._outbound.put(message)
+
+    async def _write_outbound(self) -> None:
+        queue = self._outbound
+        # WebSocket.send takes the ASGI message that send_text and send_bytes
+        # would build, and still tracks the connection state.
+        send = self.websocket.send
+        clock = asyncio.get_running_loop().time
+        try:
+            while True:
+                frames = [await queue.get()]
+                while not queue.empty():
+                    frames.append(queue.get_nowait())
+                sent = 0
+                yielded_at = clock()
+                for frame in _serialize(frames):
+                    if isinstance(frame, bytes):
+                        await send({"type": "websocket.send", "bytes": frame})
+                    else:
+                        await send({"type": "websocket.send", "text": frame})
+                    sent += 1
+                    if (
+                        sent >= WRITER_YIELD_FRAMES
+                        or clock() - yielded_at >= WRITER_YIELD_INTERVAL
+                    ):
+                        await asyncio.sleep(0)
+                        sent = 0
+                        yielded_at = clock()
+        except Exception as error:
+            self.logger.error("Error sending to the client: {}", error)
+            raise
 
     async def initialize(self) -> None:
         self.logger.debug("Configuring realtime session")
+        self._tasks.append(asyncio.create_task(self._write_outbound()))
         await self.client.configure(
+            # A set: the released SDK types this field as set[Modality] and
+            # warns when serializing anything else.
             modalities={"text", "audio"},
             voice="coral",
             input_audio_format="pcm16",
             input_audio_transcription=InputAudioTranscription(model="whisper-1"),
             turn_detection=ServerVAD(),
         )
-        greeting: ControlMessage = {
-            "type": "control",
-            "action": "connected",
-            "greeting": "You are now connected to the FastAPI server",
-        }
-        await self.send(greeting)
+        await self.send_text(_GREETING)
         self.logger.debug("Realtime session configured successfully")
-        asyncio.create_task(self.start_event_loop())
+        self._tasks.append(asyncio.create_task(self.start_event_loop()))
 
     async def handle_binary_message(self, message: bytes) -> None:
         try:
             await self.client.send_audio(message)
         except Exception as error:
-            self.logger.error("Failed to send audio data: %s", error)
+            self.logger.error("Failed to send audio data: {}", error)
             raise
 
     async def handle_text_message(self, message: str) -> None:
+        # Only user messages are handled; a message that cannot be one is
+        # skipped without parsing it. Spacing and key order vary, so the
+        # check is on the quoted type value alone.
+        if '"user_message"' not in message:
+            self.logger.debug("Ignoring text message that is not a user_message")
+            return
         try:
-            parsed: WSMessage = json.loads(message)
-            self.logger.debug("Received text message type: %s", parsed["type"])
+            parsed: WSMessage = orjson.loads(message)
+            self.logger.debug("Received text message type: {}", parsed["type"])
             if parsed["type"] == "user_message":
                 await self.client.send_item(
-                    {
-                        "type": "message",
-                        "role": "user",
-                        "content": [{"type": "input_text", "text": parsed["text"]}],
-                    }
+                    UserMessageItem(content=[InputTextContentPart(text=parsed["text"])])
                 )
                 await self.client.generate_response()
                 self.logger.debug("User message processed successfully")
         except Exception as error:
-            self.logger.error("Failed to process user message: %s", error)
+            self.logger.error("Failed to process user message: {}", error)
             raise
 
     async def handle_text_content(self, content) -> None:
         try:
-            content_id = f"{content.item_id}-{content.content_index}"
-            async for text in content.text_chunks():
-                delta_message: TextDelta = {
-                    "id": content_id,
-                    "type": "text_delta",
-                    "delta": text,
-                }
-                await self.send(delta_message)
-            await self.send(
-                {"type": "control", "action": "text_done", "id": content_id}
+            encoded_id = _encoded_content_id(content)
+            prefix = _delta_prefix(encoded_id)
+            chunks = coalesce(
+                content.text_chunks(),
+                flush_size=TEXT_FLUSH_SIZE,
+                max_delay=TEXT_FLUSH_INTERVAL,
             )
+            async for text in chunks:
+                await self.send_delta(prefix, text)
+            await self.send_text_done(encoded_id)
             self.logger.debug("Text content processed successfully")
         except Exception as error:
-            self.logger.error("Error handling text content: %s", error)
+            self.logger.error("Error handling text content: {}", error)
             raise
 
     async def handle_audio_content(self, content: RTAudioContent) -> None:
         async def handle_audio_chunks():
-            async for chunk in content.audio_chunks():
+            chunks = coalesce(
+                content.audio_chunks(),
+                flush_size=AUDIO_FLUSH_SIZE,
+                max_delay=AUDIO_FLUSH_INTERVAL,
+            )
+            async for chunk in chunks:
                 await self.send_binary(chunk)
 
         async def handle_audio_transcript():
-            content_id = f"{content.item_id}-{content.content_index}"
-            async for chunk in content.transcript_chunks():
-                await self.send(
-                    {"id": content_id, "type": "text_delta", "delta": chunk}
-                )
-            await self.send(
-                {"type": "control", "action": "text_done", "id": content_id}
+            encoded_id = _encoded_content_id(content)
+            prefix = _delta_prefix(encoded_id)
+            chunks = coalesce(
+                content.transcript_chunks(),
+                flush_size=TEXT_FLUSH_SIZE,
+                max_delay=TEXT_FLUSH_INTERVAL,
             )
+            async for chunk in chunks:
+                await self.send_delta(prefix, chunk)
+            await self.send_text_done(encoded_id)
 
         try:
-            await asyncio.gather(handle_audio_chunks(), handle_audio_transcript())
+            # Both parts arrive interleaved on one queue, so they are read
+            # concurrently; audio is forwarded inline to save a task.
+            transcript = asyncio.create_task(handle_audio_transcript())
+            try:
+                await handle_audio_chunks()
+                await transcript
+            finally:
+                transcript.cancel()
             self.logger.debug("Audio content processed successfully")
         except Exception as error:
-            self.logger.error("Error handling audio content: %s", error)
+            self.logger.error("Error handling audio content: {}", error)
             raise
 
     async def handle_response(self, event: RTResponse) -> None:
+        # Contents are independent and the client buffers each one's deltas,
+        # so they are forwarded concurrently rather than one after another.
+        tasks: list[asyncio.Task] = []
         try:
             async for item in event:
                 if item.type == "message":
                     async for content in item:
                         if content.type == "text":
-                            await self.handle_text_content(content)
+                            handler = self.handle_text_content(content)
                         elif content.type == "audio":
-                            await self.handle_audio_content(content)
+                            handler = self.handle_audio_content(content)
+                        else:
+                            continue
+                        tasks.append(asyncio.create_task(handler))
+            await asyncio.gather(*tasks)
             self.logger.debug("Response handled successfully")
         except Exception as error:
-            self.logger.error("Error handling response: %s", error)
+            self.logger.error("Error handling response: {}", error)
             raise
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def handle_input_audio(self, event: RTInputAudioItem) -> None:
         try:
-            await self.send({"type": "control", "action": "speech_started"})
+            await self.send_text(_SPEECH_STARTED)
             await event
             transcription: Transcription = {
                 "id": event.id,
@@ -202,21 +446,24 @@ class RTSession:
             }
             await self.send(transcription)
             self.logger.debug(
-                "Input audio processed successfully, transcription length: %s",
+                "Input audio processed successfully, transcription length: {}",
                 len(transcription["text"]),
             )
         except Exception as error:
-            self.logger.error("Error handling input audio: %s", error)
+            self.logger.error("Error handling input audio: {}", error)
             raise
 
     async def start_event_loop(self) -> None:
         try:
             self.logger.debug("Starting event loop")
+            handler_for = {
+                "response": self.handle_response,
+                "input_audio": self.handle_input_audio,
+            }.get
             async for event in self.client.events():
-                if event.type == "response":
-                    await self.handle_response(event)
-                elif event.type == "input_audio":
-                    await self.handle_input_audio(event)
+                handler = handler_for(event.type)
+                if handler is not None:
+                    await handler(event)
         except Exception as error:
-            self.logger.error("Error in event loop: %s", error)
+            self.logger.error("Error in event loop: {}", error)
             raise
@@ -0,0 +1,107 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "500"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+# Above this many entries lookups only score the rows in nearby LSH buckets.
+LSH_MIN_ENTRIES = 1000
+LSH_BITS = 12
+_LSH_BIT_WEIGHTS = 1 << np.arange(LSH_BITS)
+
+
+class SemanticCache:
+    """LLM responses keyed by prompt, matched exactly or by embedding similarity."""
+
+    def __init__(
+        self,
+        max_entries: int = SEMANTIC_CACHE_SIZE,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+    ) -> None:
+        self.max_entries = max_entries
+        self.threshold = threshold
+        # Normalized prompt embeddings, one row per slot, allocated on first insert.
+        self._vectors: np.ndarray | None = None
+        # (prompt, response) per occupied slot, in LRU order.
+        self._entries: OrderedDict[int, tuple[str, str]] = OrderedDict()
+        self._slots_by_prompt: dict[str, int] = {}
+        # Random hyperplanes for sign-bit LSH, and the slots hashed to each bucket.
+        self._planes: np.ndarray | None = None
+        self._buckets: dict[int, set[int]] = {}
+        self._bucket_keys: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _bucket_key(self, embedding: np.ndarray) -> int:
+        return int(((self._planes @ embedding) > 0) @ _LSH_BIT_WEIGHTS)
+
+    def _candidates(self, embedding: np.ndarray) -> np.ndarray:
+        """Slots in the query's bucket and in the buckets one bit flip away."""
+        key = self._bucket_key(embedding)
+        slots = list(self._buckets.get(key, ()))
+        for bit in range(LSH_BITS):
+            slots.extend(self._buckets.get(key ^ (1 << bit), ()))
+        return np.array(slots, dtype=np.intp)
+
+    def _nearest(self, embedding: np.ndarray) -> int | None:
+        if len(self._entries) > LSH_MIN_ENTRIES:
+            slots = self._candidates(embedding)
+            if not len(slots):
+                return None
+            scores = self._vectors[slots] @ embedding
+        else:
+            # Slots are filled in order and reused on eviction, so the first
+            # len(self) rows are exactly the occupied ones.
+            slots = None
+            scores = self._vectors[: len(self._entries)] @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return best if slots is None else int(slots[best])
+
+    def get(self, prompt: str, embedding: np.ndarray) -> str | None:
+        """Return the cached response for the prompt or a close paraphrase of it."""
+        slot = self._slots_by_prompt.get(prompt)
+        if slot is None and self._entries:
+            slot = self._nearest(embedding)
+        if slot is None:
+            return None
+        self._entries.move_to_end(slot)
+        return self._entries[slot][1]
+
+    def put(self, prompt: str, embedding: np.ndarray, response: str) -> None:
+        """Cache a response, evicting the least recently used entry when full."""
+        if self._vectors is None:
+            self._vectors = np.empty(
+                (self.max_entries, len(embedding)), dtype=np.float32
+            )
+            self._planes = np.random.default_rng().standard_normal(
+                (LSH_BITS, len(embedding)), dtype=np.float32
+            )
+
+        slot = self._slots_by_prompt.get(prompt)
+        if slot is None:
+            if len(self._entries) < self.max_entries:
+                slot = len(self._entries)
+            else:
+                slot, (evicted_prompt, _) = self._entries.popitem(last=False)
+                del self._slots_by_prompt[evicted_prompt]
+            self._slots_by_prompt[prompt] = slot
+
+        if slot in self._bucket_keys:
+            self._buckets[self._bucket_keys[slot]].discard(slot)
+        key = self._bucket_key(embedding)
+        self._buckets.setdefault(key, set()).add(slot)
+        self._bucket_keys[slot] = key
+        self._vectors[slot] = embedding
+        self._entries[slot] = (prompt, response)
+        self._entries.move_to_end(slot)
+
+    def clear(self) -> None:
+        """Drop every cached response, e.g. after the document corpus changes."""
+        self._entries.clear()
+        self._slots_by_prompt.clear()
+        self._buckets.clear()
+        self._bucket_keys.clear()
@@ -0,0 +1,51 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import AnyStr
+
+
+async def coalesce(
+    source: AsyncIterable[AnyStr], *, flush_size: int, max_delay: float
+) -> AsyncIterator[AnyStr]:
+    """Merge consecutive pieces from ``source`` into fewer, larger ones.
+
+    Pending pieces are joined and emitted once they add up to at least
+    ``flush_size`` or ``max_delay`` seconds after the first of them arrived,
+    whichever is first, so batching never delays a piece by more than
+    ``max_delay``. ``flush_size`` is a threshold, not a cap: pieces are never
+    split, so an emitted piece can exceed it by up to one source piece.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = aiter(source)
+    parts: list[AnyStr] = []
+    size = 0
+    deadline = None
+    # Waiting on the same task across timeouts, rather than wait_for(), keeps
+    # a timeout from cancelling the underlying iterator.
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if done:
+                task, pending = pending, None
+                try:
+                    piece = task.result()
+                except StopAsyncIteration:
+                    break
+                parts.append(piece)
+                size += len(piece)
+                if deadline is None:
+                    deadline = loop.time() + max_delay
+                if size < flush_size:
+                    continue
+            yield parts[0][:0].join(parts)
+            parts.clear()
+            size = 0
+            deadline = None
+        if parts:
+            yield parts[0][:0].join(parts)
+    finally:
+        if pending is not None:
+            pending.cancel()